@@ -1,8 +1,51 @@
 import os
+import re
+import mmap
+import sys
 import json
+import queue
 import random
-from typing import List, Dict, Tuple
+import threading
 from collections import Counter
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import partial
+from typing import List, Dict, Optional, Tuple
+
+# Optional compiled freq_enc (see freq_enc_c.pyx).
+try:
+    from freq_enc_c import freq_enc as _freq_enc_native
+except ImportError:
+    _freq_enc_native = None
+
+# Prefer a C JSON parser when one is installed; each backend's loads()
+# accepts the raw bytes of a file. They are stricter than json (no NaN,
+# Infinity or lone surrogates), so _parse_fields retries with json before
+# treating a file as malformed.
+try:
+    import orjson as fast_json
+except ImportError:
+    try:
+        import ujson as fast_json
+    except ImportError:
+        fast_json = json
+
+# Opt-in fast path for reading the two fields write_aggregated_files needs;
+# see _extract_two_fields.
+_OBJECT_RE = re.compile(rb'\A[ \t\n\r]*\{.*\}[ \t\n\r]*\Z', re.DOTALL)
+_COLON_RE = re.compile(rb'[ \t\n\r]*:[ \t\n\r]*"')
+_CONTROL_BYTES = bytes(range(0x20))
+
+# Inputs larger than this are read ahead aggressively via MADV_SEQUENTIAL.
+MADVISE_MIN_BYTES = 64 * 1024
+
+# Size of the binary write buffer behind each output file.
+WRITE_BUFFER_BYTES = 1 << 22
+
+# Encoded line pairs waiting for the writer thread.
+WRITE_QUEUE_SIZE = 1024
+
+# Rank strings are looked up here instead of calling str() for each rank.
+_DIGITS = tuple(str(i) for i in range(4096))
 
 def freq_enc(text: str) -> str:
     """
@@ -13,33 +56,45 @@ def freq_enc(text: str) -> str:
     2. Ranks the tokens based on their total frequency (most frequent = rank 0).
     3. Maps the original sequence of tokens to their rank IDs.
     """
+    if _freq_enc_native is not None and text.isascii():
+        return _freq_enc_native(text)
+
     tokens = text.split()
     if not tokens:
         return ""
 
-    counts = Counter(tokens)
-    
-    first_occurrence_order: Dict[str, int] = {
-        token: i for i, token in enumerate(tokens) 
-        if token not in tokens[:i]
-    }
+    # Tokens repeat heavily; interned copies share one object per distinct
+    # value, so the dict lookups below compare by identity.
+    tokens = [sys.intern(token) for token in tokens]
 
-    char_rank_data: List[Tuple[int, int, str]] = []
+    # Counter tallies in C and keeps insertion order, so counts also lists
+    # each distinct token in order of first occurrence.
+    counts: Dict[str, int] = Counter(tokens)
+
+    # Bucket by frequency instead of sorting (-freq, first_index) tuples;
+    # each bucket is filled in first-occurrence order, which breaks ties.
+    # Only distinct frequencies get a bucket, and there are at most about
+    # sqrt(2 * len(tokens)) of those.
+    buckets: Dict[int, List[str]] = {}
     for token, freq in counts.items():
-        char_rank_data.append((-freq, first_occurrence_order[token], token))
-    
-    char_rank_data.sort() 
-    char_to_rank_id: Dict[str, int] = {}
-    for rank_id, (_, _, token) in enumerate(char_rank_data):
-        char_to_rank_id[token] = rank_id
+        buckets.setdefault(freq, []).append(token)
+
+    rank_str: Dict[str, str] = {}
+    for freq in sorted(buckets, reverse=True):
+        for token in buckets[freq]:
+            rank_id = len(rank_str)
+            rank_str[token] = _DIGITS[rank_id] if rank_id < len(_DIGITS) else str(rank_id)
     
-    encoded_list = [str(char_to_rank_id[token]) for token in tokens]
-    return " ".join(encoded_list)
+    return " ".join([rank_str[token] for token in tokens])
 
-def fairseq_data(input_data_dir: str, output_data_dir: str, validation_split: float = 0.02):
+def fairseq_data(input_data_dir: str, output_data_dir: str, validation_split: float = 0.02,
+                 lenient_json: bool = False):
     """
     Reads JSON files, splits training data for validation, and writes the 
     aggregated raw data files (.src, .tgt) for Fairseq preprocessing.
+
+    lenient_json reads the two fields without a full parse (see
+    _extract_two_fields); it is faster but lets some malformed files through.
     """
     
     os.makedirs(output_data_dir, exist_ok=True)
@@ -47,33 +102,33 @@ def fairseq_data(input_data_dir: str, output_data_dir: str, validation_split: fl
     all_train_files: List[str] = []
     test_files: List[str] = []
     
-    for filename in os.listdir(input_data_dir):
-        if filename.endswith('.json'):
-            file_path = os.path.join(input_data_dir, filename)
-            
-            if filename.startswith('test-cipher-'):
-                test_files.append(file_path)
+    with os.scandir(input_data_dir) as entries:
+        for entry in entries:
+            if not entry.name.endswith('.json'):
+                continue
+
+            if entry.name.startswith('test-cipher-'):
+                test_files.append(entry.path)
             else:
-                all_train_files.append(file_path)
+                all_train_files.append(entry.path)
 
     if not all_train_files and not test_files:
         print("Error: No JSON files found in the input directory.")
         return
 
-    random.shuffle(all_train_files)
-    
     split_index = int(len(all_train_files) * validation_split)
-    valid_files = all_train_files[:split_index]
-    train_files = all_train_files[split_index:]
+    train_files, valid_files = _split_validation(all_train_files, split_index)
 
     print(f"Total Ciphers Found: {len(all_train_files) + len(test_files)}")
     print(f"  Training Files: {len(train_files)}")
     print(f"  Validation Files (Split: {validation_split:.2f}): {len(valid_files)}")
     print(f"  Testing Files: {len(test_files)}")
 
-    write_aggregated_files(train_files, output_data_dir, 'train')
-    write_aggregated_files(valid_files, output_data_dir, 'valid')
-    write_aggregated_files(test_files, output_data_dir, 'test')
+    # One pool serves all three splits.
+    with ProcessPoolExecutor() as executor:
+        write_aggregated_files(train_files, output_data_dir, 'train', lenient_json, executor)
+        write_aggregated_files(valid_files, output_data_dir, 'valid', lenient_json, executor)
+        write_aggregated_files(test_files, output_data_dir, 'test', lenient_json, executor)
 
     print("\nData preparation complete. Raw files for Fairseq Preprocessing are:")
     print(f"  {output_data_dir}/train.src, train.tgt")
@@ -81,33 +136,192 @@ def fairseq_data(input_data_dir: str, output_data_dir: str, validation_split: fl
     print(f"  {output_data_dir}/test.src, test.tgt")
 
 
-def write_aggregated_files(file_list: List[str], output_dir: str, prefix: str):
+def _split_validation(file_paths: List[str], k: int) -> Tuple[List[str], List[str]]:
+    """
+    Splits file_paths into (train, valid) with k validation files chosen
+    uniformly at random. Both lists keep the order of file_paths, so no
+    shuffled copy of the list is needed.
+    """
+    chosen = set(random.sample(range(len(file_paths)), k))
+    train_files: List[str] = []
+    valid_files: List[str] = []
+    for i, path in enumerate(file_paths):
+        (valid_files if i in chosen else train_files).append(path)
+    return train_files, valid_files
+
+
+def write_aggregated_files(file_list: List[str], output_dir: str, prefix: str,
+                           lenient_json: bool = False, executor: Optional[Executor] = None):
     """
     Helper function: Writes ciphertexts, plaintexts, and frequency encodings 
     to aggregated .src, .tgt, and .freq files.
+
+    Files are parsed and encoded in executor, or in a process pool created
+    for this call if none is given; results are written in the order of
+    file_list.
     """
+    if executor is None:
+        with ProcessPoolExecutor() as executor:
+            write_aggregated_files(file_list, output_dir, prefix, lenient_json, executor)
+        return
     
     cipher_file_path = os.path.join(output_dir, f"{prefix}.src")
     plaintext_file_path = os.path.join(output_dir, f"{prefix}.tgt")
 
-    with open(cipher_file_path, 'w', encoding='utf-8') as f_cipher, \
-         open(plaintext_file_path, 'w', encoding='utf-8') as f_plain:
+    with open(cipher_file_path, 'wb', buffering=WRITE_BUFFER_BYTES) as f_cipher, \
+         open(plaintext_file_path, 'wb', buffering=WRITE_BUFFER_BYTES) as f_plain:
+        
+        # A writer thread drains the output while results keep arriving from
+        # the pool; output order is unchanged.
+        lines: queue.Queue = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+        errors: List[BaseException] = []
+        writer = threading.Thread(target=_write_lines, args=(lines, f_cipher, f_plain, errors))
+        writer.start()
+        try:
+            read_one = partial(_read_one, lenient_json=lenient_json)
+            for result in executor.map(read_one, file_list, chunksize=64):
+                if result is not None:
+                    lines.put(result)
+        finally:
+            lines.put(None)
+            writer.join()
+
+        if errors:
+            raise errors[0]
+
+
+def _write_lines(lines: queue.Queue, f_cipher, f_plain, errors: List[BaseException]):
+    """
+    Writer thread for write_aggregated_files: takes (src, tgt) line pairs off
+    lines until None and writes them. Any exception is stored in errors for
+    the producer to re-raise.
+    """
+    item = lines.get()
+    try:
+        while item is not None:
+            freq_encoding, spaced_plain = item
+            # Encodings are digits and spaces only.
+            f_cipher.write((freq_encoding + '\n').encode('ascii'))
+            f_plain.write((spaced_plain + '\n').encode('utf-8'))
+            item = lines.get()
+    except BaseException as e:
+        errors.append(e)
+        # Keep consuming so the producer never blocks on a full queue.
+        while item is not None:
+            item = lines.get()
+
+
+def _read_one(file_path: str, lenient_json: bool = False) -> Optional[Tuple[str, str]]:
+    """
+    Worker for write_aggregated_files: reads one JSON file and returns its
+    (frequency encoding, spaced plaintext) lines, or None if it is skipped.
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            # mmap cannot map an empty file; let the parser reject it.
+            if os.fstat(f.fileno()).st_size == 0:
+                ciphertext, plaintext = _parse_fields(b'', lenient_json)
+            else:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                    if len(buf) > MADVISE_MIN_BYTES and hasattr(mmap, 'MADV_SEQUENTIAL'):
+                        buf.madvise(mmap.MADV_SEQUENTIAL)
+                    ciphertext, plaintext = _parse_fields(buf, lenient_json)
         
-        for file_path in file_list:
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                
-                ciphertext = data['ciphertext']
-                plaintext = data['plaintext']
-                
-                freq_encoding = freq_enc(ciphertext)
-                f_cipher.write(freq_encoding + '\n')
-                
-                spaced_plain = " ".join(list(plaintext))
-                f_plain.write(spaced_plain + '\n')
-                
-            except json.JSONDecodeError:
-                print(f"Warning: Skipping malformed JSON file: {file_path}")
-            except KeyError:
-                print(f"Warning: Skipping file missing 'ciphertext' or 'plaintext' key: {file_path}")
\ No newline at end of file
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        print(f"Warning: Skipping malformed JSON file: {file_path}")
+        return None
+    except KeyError:
+        print(f"Warning: Skipping file missing 'ciphertext' or 'plaintext' key: {file_path}")
+        return None
+
+    freq_encoding = freq_enc(ciphertext)
+    spaced_plain = " ".join(plaintext)
+    return freq_encoding, spaced_plain
+
+
+def _parse_fields(buf, lenient_json: bool = False) -> Tuple[str, str]:
+    """
+    Returns (ciphertext, plaintext) from the contents of one JSON file. Raises
+    json.JSONDecodeError, UnicodeDecodeError or KeyError for files that
+    json.load on a UTF-8 text stream would not accept. With lenient_json,
+    some malformed files are accepted instead (see _extract_two_fields).
+    """
+    if lenient_json:
+        fields = _extract_two_fields(buf)
+        if fields is not None:
+            return fields
+
+    # Not every JSON backend accepts an mmap, so hand it a bytes copy.
+    raw = buf[:]
+    if fast_json is not json:
+        try:
+            data = fast_json.loads(raw)
+        except ValueError:
+            pass
+        else:
+            return data['ciphertext'], data['plaintext']
+
+    data = json.loads(raw.decode('utf-8'))
+    return data['ciphertext'], data['plaintext']
+
+
+def _extract_two_fields(buf: bytes) -> Optional[Tuple[str, str]]:
+    """
+    Pulls 'ciphertext' and 'plaintext' straight out of the raw file bytes
+    without building the whole JSON object. Returns None when either field
+    is missing, repeated, nested or needs unescaping, in which case the
+    caller falls back to a full parse. The rest of the document is not
+    validated, so a malformed file (e.g. a trailing or missing comma) whose
+    two fields are readable is accepted rather than skipped; it is only
+    used when lenient_json is requested.
+    """
+    if _OBJECT_RE.match(buf) is None:
+        return None
+
+    ciphertext = _raw_string_field(buf, b'"ciphertext"')
+    plaintext = _raw_string_field(buf, b'"plaintext"')
+    if ciphertext is None or plaintext is None:
+        return None
+
+    try:
+        return ciphertext.decode('utf-8'), plaintext.decode('utf-8')
+    except UnicodeDecodeError:
+        return None
+
+
+def _raw_string_field(buf: bytes, key: bytes) -> Optional[bytes]:
+    """
+    Returns the undecoded string value of key, or None unless key occurs
+    exactly once, as a key of the top-level object, with a plain string
+    value. buf may be an mmap, which has find() but no count().
+    """
+    key_start = buf.find(key)
+    if key_start < 0 or buf.find(key, key_start + 1) >= 0:
+        return None
+
+    # Only the outer brace may precede the key; any other brace (even one
+    # inside a string) could mean the key is nested, so let the parser decide.
+    outer = buf.find(b'{')
+    if buf.find(b'{', outer + 1, key_start) >= 0 or buf.find(b'}', 0, key_start) >= 0:
+        return None
+
+    # A real key follows '{' or ','; anything else (e.g. a backslash, as
+    # in "say \"ciphertext") means the match is inside another string.
+    i = key_start - 1
+    while buf[i] in b' \t\n\r':
+        i -= 1
+    if buf[i] not in b'{,':
+        return None
+
+    colon = _COLON_RE.match(buf, key_start + len(key))
+    if colon is None:
+        return None
+
+    value_end = buf.find(b'"', colon.end())
+    if value_end < 0:
+        return None
+
+    value = buf[colon.end():value_end]
+    if b'\\' in value or len(value.translate(None, _CONTROL_BYTES)) != len(value):
+        return None
+    return value
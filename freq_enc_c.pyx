@@ -0,0 +1,92 @@
+# distutils: language = c++
+# cython: language_level=3, boundscheck=False, wraparound=False
+"""
+Native implementation of freq_enc.freq_enc for ASCII input.
+
+Build in place with `cythonize -i freq_enc_c.pyx`; freq_enc.py picks the
+module up automatically when it is importable and falls back to the pure
+Python implementation otherwise.
+"""
+from cython.operator cimport dereference as deref
+from libcpp.string cimport string, to_string
+from libcpp.unordered_map cimport unordered_map
+from libcpp.vector cimport vector
+
+
+cdef inline bint _is_space(unsigned char c) nogil:
+    # The ASCII characters str.split() treats as whitespace, including the
+    # \x1c-\x1f separators.
+    return c == 32 or 9 <= c <= 13 or 28 <= c <= 31
+
+
+def freq_enc(str text) -> str:
+    """
+    Same contract as freq_enc.freq_enc; text must be ASCII.
+    """
+    cdef bytes data = text.encode('ascii')
+    cdef const unsigned char* buf = data
+    cdef Py_ssize_t n = len(data)
+    cdef Py_ssize_t i = 0
+    cdef Py_ssize_t start
+
+    # Token ids are handed out in order of first occurrence.
+    cdef unordered_map[string, int] token_ids
+    cdef unordered_map[string, int].iterator it
+    cdef vector[int] sequence
+    cdef vector[int] counts
+    cdef string token
+    cdef int token_id
+
+    while i < n:
+        while i < n and _is_space(buf[i]):
+            i += 1
+        if i == n:
+            break
+        start = i
+        while i < n and not _is_space(buf[i]):
+            i += 1
+
+        token = string(<const char*>buf + start, i - start)
+        it = token_ids.find(token)
+        if it == token_ids.end():
+            token_id = counts.size()
+            token_ids[token] = token_id
+            counts.push_back(0)
+        else:
+            token_id = deref(it).second
+        counts[token_id] += 1
+        sequence.push_back(token_id)
+
+    if sequence.empty():
+        return ""
+
+    # Counting sort by descending frequency; visiting ids in first-occurrence
+    # order keeps ties ordered the same way as the Python implementation.
+    cdef int num_tokens = counts.size()
+    cdef int max_freq = 0
+    cdef int t, f
+    for t in range(num_tokens):
+        if counts[t] > max_freq:
+            max_freq = counts[t]
+
+    cdef vector[int] next_rank = vector[int](max_freq + 2, 0)
+    for t in range(num_tokens):
+        next_rank[max_freq - counts[t] + 1] += 1
+    for f in range(1, max_freq + 2):
+        next_rank[f] += next_rank[f - 1]
+
+    cdef vector[string] rank_str = vector[string](num_tokens)
+    for t in range(num_tokens):
+        f = max_freq - counts[t]
+        rank_str[t] = to_string(next_rank[f])
+        next_rank[f] += 1
+
+    cdef string out
+    cdef size_t j
+    out.reserve(n)
+    for j in range(sequence.size()):
+        if j:
+            out.push_back(b' ')
+        out.append(rank_str[sequence[j]])
+
+    return out.decode('ascii')
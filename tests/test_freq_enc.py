@@ -0,0 +1,225 @@
+import json
+import mmap
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from collections import Counter
+from contextlib import redirect_stdout
+from io import StringIO
+from unittest import mock
+
+import freq_enc
+
+try:
+    import freq_enc_c
+except ImportError:
+    freq_enc_c = None
+
+
+def reference_freq_enc(text):
+    # The original sort-based definition: rank by frequency, most frequent
+    # first, ties broken by first occurrence.
+    tokens = text.split()
+    counts = Counter(tokens)
+    first = {}
+    for i, token in enumerate(tokens):
+        first.setdefault(token, i)
+    ranked = sorted(counts, key=lambda token: (-counts[token], first[token]))
+    rank = {token: i for i, token in enumerate(ranked)}
+    return " ".join(str(rank[token]) for token in tokens)
+
+
+def random_ciphertexts():
+    rng = random.Random(0)
+    texts = [
+        "", "   ", "7", "1 1 1", "150 273 14 233 150", "7 07 7",
+        " 3\t4\n3\x1c5\x1f3 ", "x\xa0y x", "\u00fc a \u00fc",
+        " ".join(["1"] * 5000 + ["2"]),
+    ]
+    for n in (1, 10, 300, 3000):
+        for alphabet in (2, 26, 300, 5000):
+            texts.append(" ".join(str(rng.randrange(alphabet)) for _ in range(n)))
+    return texts
+
+
+# Valid JSON the raw-bytes fast path has to agree with json.loads on.
+VALID_JSON = [
+    b'{"ciphertext": "1 2", "plaintext": "ab"}',
+    b' {"plaintext" :"ab",\n\t"ciphertext": "1"}\n',
+    b'{"ciphertext": "1 1 2", "plaintext": "ab", "ciphertext": "3 4 4"}',
+    b'{"meta": {"ciphertext": "9"}, "ciphertext": "1 2", "plaintext": "ab"}',
+    b'{"meta": {"ciphertext": "9"}, "plaintext": "ab"}',
+    b'{"say \\"ciphertext": "9", "plaintext": "ab"}',
+    b'{"say \\"ciphertext": "9", "ciphertext": "1", "plaintext": "ab"}',
+    b'{"a": "{", "ciphertext": "1", "plaintext": "ab"}',
+    b'{"a": ["ciphertext"], "ciphertext": "1", "plaintext": "ab"}',
+    b'{"ciphertext": ["1", "2"], "plaintext": "ab"}',
+    b'{"ciphertext": "1", "plaintext": "a\\"b\\\\"}',
+    b'{"ciphertext": "1", "plaintext": "\\u00fc"}',
+    b'{"ciphertext": "1", "plaintext": "\xc3\xbc"}',
+    b'{"ciphertext": "1", "plaintext": "ab", "x": NaN}',
+    b'{"ciphertext": "1", "plaintext": "\\ud800"}',
+    b'{"plaintext": "ab"}',
+]
+
+# Input json.loads rejects.
+MALFORMED_JSON = [
+    b'',
+    b'{"ciphertext": ',
+    b'\xef\xbb\xbf{"ciphertext": "1", "plaintext": "ab"}',
+    b'{"ciphertext": "1", "plaintext": "a\nb"}',
+    b'{"ciphertext": "1", "plaintext": "\xff"}',
+    b'{"ciphertext": "1 2", "plaintext": "ab",}',
+    b'{"ciphertext": "1 2", "plaintext": "ab"} }',
+    b'{"ciphertext": "1 2", "plaintext": "ab", ]]] }',
+    b'{"ciphertext": "1 2", "plaintext": "ab" "x": 1}',
+]
+
+
+def reference_fields(buf):
+    try:
+        data = json.loads(buf.decode('utf-8'))
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return 'malformed'
+    try:
+        return data['ciphertext'], data['plaintext']
+    except KeyError:
+        return 'missing'
+
+
+def parse_fields(buf, lenient_json=False):
+    try:
+        return freq_enc._parse_fields(buf, lenient_json)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return 'malformed'
+    except KeyError:
+        return 'missing'
+
+
+class TestFreqEnc(unittest.TestCase):
+
+    def test_python_path_matches_reference(self):
+        with mock.patch.object(freq_enc, '_freq_enc_native', None):
+            for text in random_ciphertexts():
+                with self.subTest(text=text[:40]):
+                    self.assertEqual(freq_enc.freq_enc(text), reference_freq_enc(text))
+
+    def test_large_ranks(self):
+        with mock.patch.object(freq_enc, '_freq_enc_native', None):
+            text = " ".join(str(i) for i in range(5000))
+            self.assertEqual(freq_enc.freq_enc(text), " ".join(str(i) for i in range(5000)))
+
+    @unittest.skipIf(freq_enc_c is None, 'freq_enc_c is not built')
+    def test_native_matches_python_path(self):
+        with mock.patch.object(freq_enc, '_freq_enc_native', None):
+            for text in random_ciphertexts():
+                if not text.isascii():
+                    continue
+                with self.subTest(text=text[:40]):
+                    self.assertEqual(freq_enc_c.freq_enc(text), freq_enc.freq_enc(text))
+
+
+class TestParseFields(unittest.TestCase):
+
+    def test_valid_json_matches_json_loads(self):
+        for buf in VALID_JSON:
+            with self.subTest(buf=buf):
+                expected = reference_fields(buf)
+                self.assertEqual(parse_fields(buf), expected)
+                self.assertEqual(parse_fields(buf, lenient_json=True), expected)
+
+    def test_malformed_json_is_rejected_by_default(self):
+        for buf in MALFORMED_JSON:
+            with self.subTest(buf=buf):
+                self.assertEqual(reference_fields(buf), 'malformed')
+                self.assertEqual(parse_fields(buf), 'malformed')
+
+    def test_fast_path_result_matches_json_loads(self):
+        # Whenever the fast path answers instead of falling back, valid
+        # input must give exactly what json.loads gives.
+        for buf in VALID_JSON:
+            with self.subTest(buf=buf):
+                fields = freq_enc._extract_two_fields(buf)
+                if fields is not None:
+                    self.assertEqual(fields, reference_fields(buf))
+
+    def test_lenient_accepts_malformed_but_readable_fields(self):
+        self.assertEqual(
+            parse_fields(b'{"ciphertext": "1 2", "plaintext": "ab",}', lenient_json=True),
+            ('1 2', 'ab'),
+        )
+
+    def test_mmap_matches_bytes(self):
+        for buf in VALID_JSON + MALFORMED_JSON:
+            if not buf:
+                continue
+            with self.subTest(buf=buf), tempfile.TemporaryFile() as f:
+                f.write(buf)
+                f.flush()
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    for lenient_json in (False, True):
+                        self.assertEqual(
+                            parse_fields(mm, lenient_json), parse_fields(buf, lenient_json)
+                        )
+
+
+class TestSplitValidation(unittest.TestCase):
+
+    def test_split_sizes_order_and_disjointness(self):
+        paths = [f'cipher-{i}.json' for i in range(50)]
+        random.seed(3)
+        for k in (0, 1, 7, 50):
+            with self.subTest(k=k):
+                train_files, valid_files = freq_enc._split_validation(paths, k)
+                self.assertEqual(len(valid_files), k)
+                self.assertEqual(len(train_files), len(paths) - k)
+                self.assertFalse(set(train_files) & set(valid_files))
+                self.assertEqual(sorted(train_files + valid_files), sorted(paths))
+                self.assertEqual(train_files, [p for p in paths if p in train_files])
+                self.assertEqual(valid_files, [p for p in paths if p in valid_files])
+
+    def test_every_file_can_be_chosen(self):
+        paths = [f'cipher-{i}.json' for i in range(10)]
+        random.seed(0)
+        chosen = set()
+        for _ in range(200):
+            chosen.update(freq_enc._split_validation(paths, 3)[1])
+        self.assertEqual(chosen, set(paths))
+
+
+class TestWriteAggregatedFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_malformed_files_are_skipped(self):
+        paths = []
+        for i, buf in enumerate([b'{"ciphertext": "5 7 5", "plaintext": "abc"}'] + MALFORMED_JSON):
+            path = os.path.join(self.tmp_dir, f'cipher-{i}.json')
+            with open(path, 'wb') as f:
+                f.write(buf)
+            paths.append(path)
+
+        # Workers print their warnings in other processes, so check the
+        # skip decision in-process first.
+        for path in paths[1:]:
+            with self.subTest(path=path), redirect_stdout(StringIO()) as out:
+                self.assertIsNone(freq_enc._read_one(path))
+                self.assertIn('Skipping malformed JSON file', out.getvalue())
+
+        with redirect_stdout(StringIO()):
+            freq_enc.write_aggregated_files(paths, self.tmp_dir, 'train')
+
+        with open(os.path.join(self.tmp_dir, 'train.src'), encoding='utf-8') as f:
+            self.assertEqual(f.read(), '0 1 0\n')
+        with open(os.path.join(self.tmp_dir, 'train.tgt'), encoding='utf-8') as f:
+            self.assertEqual(f.read(), 'a b c\n')
+
+
+if __name__ == '__main__':
+    unittest.main()